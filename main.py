@@ -1,22 +1,39 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response, StreamingResponse
+from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from pydantic import BaseModel
 from datetime import datetime, timezone, timedelta
 from typing import Optional, List
 import os
-import json
-import csv
-import io
+import asyncio
+import logging
+import logging.handlers
+import queue
+import orjson
 import zipfile
+from html import escape
+from urllib.parse import quote
 from bson import ObjectId
+from bson.errors import InvalidId
 from dotenv import load_dotenv
 
 # 載入 .env 檔案
 load_dotenv()
 
-app = FastAPI(title="EmoGo Backend API with GridFS")
+# 預設以 orjson 序列化所有 JSON 回應
+app = FastAPI(title="EmoGo Backend API with GridFS", default_response_class=ORJSONResponse)
+
+# Logging 設定：handler 只把紀錄放進 queue，實際寫入 stdout 由 QueueListener 的 thread 負責，
+# 避免在 event loop 上做同步 I/O
+logger = logging.getLogger("emogo")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream_handler)
 
 # CORS 設定
 app.add_middleware(
@@ -31,36 +48,140 @@ app.add_middleware(
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "emogo_database")
 
+# MongoDB 連線池與傳輸壓縮設定（伺服器端需啟用相同的 compressor 才會生效）
+MONGODB_CLIENT_OPTIONS = {
+    "maxPoolSize": 100,
+    "minPoolSize": 10,
+    "maxIdleTimeMS": 30000,
+    "compressors": "zstd,snappy",
+    "connectTimeoutMS": 2000,
+    "serverSelectionTimeoutMS": 5000,
+}
+
 # 台灣時區 (UTC+8)
 TW_TZ = timezone(timedelta(hours=8))
 
-def to_tw_time(dt):
-    """將 datetime 轉換為台灣時間字串"""
+# 匯出時每次從 MongoDB 取回的文件數
+EXPORT_BATCH_SIZE = 500
+# 預覽頁面最多顯示的筆數
+PREVIEW_LIMIT = 100
+# 匯出分頁 limit 參數的上限（BSON int64 最大值）
+MAX_PAGE_LIMIT = 2**63 - 1
+# 上傳影片時每次讀取的位元組數
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 匯出與頁面顯示使用的時間格式（Python strftime 與 MongoDB $dateToString 共用）
+TW_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def to_tw_time(dt, _utc=timezone.utc, _tz=TW_TZ):
+    """將 datetime 轉換為台灣時間字串（MongoDB 取回的 naive datetime 視為 UTC）
+    
+    輸出格式同 TW_TIME_FORMAT；直接以 f-string 組字串，省去 strftime 每次解析格式。
+    """
     if dt is None:
         return "N/A"
-    if isinstance(dt, str):
+    if not isinstance(dt, datetime):
         return dt
     if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    tw_time = dt.astimezone(TW_TZ)
-    return tw_time.strftime("%Y-%m-%d %H:%M:%S")
+        dt = dt.replace(tzinfo=_utc)
+    dt = dt.astimezone(_tz)
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
+
+def _tw_date_expr(field):
+    """MongoDB 運算式：將 date 欄位轉為台灣時間字串，其他型別保持原樣"""
+    return {
+        "$cond": [
+            {"$eq": [{"$type": f"${field}"}, "date"]},
+            {"$dateToString": {
+                "format": TW_TIME_FORMAT,
+                "date": f"${field}",
+                "timezone": "Asia/Taipei"
+            }},
+            f"${field}"
+        ]
+    }
+
+# 匯出用 aggregation pipeline：在 MongoDB 端完成 _id 轉字串與時區轉換
+SENTIMENTS_EXPORT_PIPELINE = [
+    {"$set": {"_id": {"$toString": "$_id"}, "timestamp": _tw_date_expr("timestamp")}}
+]
+GPS_EXPORT_PIPELINE = [
+    {"$set": {"_id": {"$toString": "$_id"}, "timestamp": _tw_date_expr("timestamp")}},
+    {"$unset": "accuracy"}
+]
+VLOGS_EXPORT_PIPELINE = [
+    {"$set": {
+        "_id": {"$toString": "$_id"},
+        "file_id": {"$ifNull": [{"$toString": "$file_id"}, ""]},
+        "upload_time": _tw_date_expr("upload_time")
+    }}
+]
+
+# 表格（CSV / 預覽頁）用 projection：只取需要的欄位，時間在 MongoDB 端轉換
+SENTIMENTS_TABLE_PROJECTION = {"$project": {
+    "_id": 0,
+    "emotion": 1,
+    "score": 1,
+    "note": 1,
+    "timestamp": _tw_date_expr("timestamp")
+}}
+GPS_TABLE_PROJECTION = {"$project": {
+    "_id": 0,
+    "latitude": 1,
+    "longitude": 1,
+    "timestamp": _tw_date_expr("timestamp")
+}}
+VLOGS_LIST_PROJECTION = {"$project": {
+    "filename": 1,
+    "original_filename": 1,
+    "description": 1,
+    "size": 1,
+    "size_mb_str": 1,
+    "upload_time": 1
+}}
+
+SENTIMENTS_PREVIEW_PIPELINE = [{"$limit": PREVIEW_LIMIT}, SENTIMENTS_TABLE_PROJECTION]
+GPS_PREVIEW_PIPELINE = [{"$limit": PREVIEW_LIMIT}, GPS_TABLE_PROJECTION]
+
+def _page_stages(limit, after):
+    """依 limit / after 參數產生以 _id 分頁的 pipeline stages"""
+    stages = []
+    if after:
+        try:
+            stages.append({"$match": {"_id": {"$gt": ObjectId(after)}}})
+        except InvalidId:
+            raise HTTPException(status_code=400, detail=f"Invalid 'after' id: {after}")
+    # MongoDB 只接受 8-byte 整數，過大的 limit 要在開始串流前就擋下
+    if limit is not None and not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Invalid 'limit': {limit} (must be between 1 and {MAX_PAGE_LIMIT})")
+    stages.append({"$sort": {"_id": 1}})
+    if limit is not None:
+        stages.append({"$limit": limit})
+    return stages
 
 # MongoDB 連接會在 startup 事件中初始化
 @app.on_event("startup")
 async def startup_db_client():
     """啟動時連接 MongoDB 和 GridFS"""
-    app.mongodb_client = AsyncIOMotorClient(MONGODB_URI)
+    _log_listener.start()
+    app.mongodb_client = AsyncIOMotorClient(MONGODB_URI, **MONGODB_CLIENT_OPTIONS)
     app.mongodb = app.mongodb_client[DB_NAME]
+    # 先 ping 一次，讓連線池在第一個請求之前就建立好
+    await app.mongodb.command("ping")
     # 🆕 初始化 GridFS
     app.fs = AsyncIOMotorGridFSBucket(app.mongodb)
-    print(f"✅ Connected to MongoDB: {DB_NAME}")
-    print(f"✅ GridFS initialized for video storage")
+    logger.info(f"✅ Connected to MongoDB: {DB_NAME}")
+    logger.info("✅ GridFS initialized for video storage")
+    # 建立下載影片時以 filename 查詢用的索引（create_index 為冪等操作，每次啟動皆可安全執行）
+    await app.mongodb["vlogs"].create_index("filename")
+    logger.info("✅ Indexes ensured")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """關閉時斷開 MongoDB 連接"""
     app.mongodb_client.close()
-    print("❌ Disconnected from MongoDB")
+    logger.info("❌ Disconnected from MongoDB")
+    _log_listener.stop()
 
 # Pydantic models
 class Sentiment(BaseModel):
@@ -76,31 +197,37 @@ class GPSCoordinate(BaseModel):
 
 # API Endpoints
 
+# 首頁 API 說明（內容固定，模組載入時預先編碼為 JSON bytes）
+ROOT_INFO = {
+    "message": "Welcome to EmoGo Backend API with GridFS",
+    "storage": "Videos stored permanently in MongoDB GridFS",
+    "endpoints": {
+        "POST /sentiments": "上傳情緒資料",
+        "POST /sentiments/bulk": "批次上傳多筆情緒資料",
+        "POST /gps": "上傳 GPS 座標",
+        "POST /gps/bulk": "批次上傳多筆 GPS 座標",
+        "POST /vlogs": "上傳影片（GridFS 永久儲存）",
+        "GET /export": "資料匯出頁面",
+        "GET /export/sentiments/csv": "下載情緒資料 (CSV)",
+        "GET /export/gps/csv": "下載 GPS 資料 (CSV)",
+        "GET /export/vlogs": "取得影片列表",
+        "GET /export/all": "在網頁查看所有資料 (JSON)",
+        "GET /export/all/download": "下載所有資料 (JSON 檔案)"
+    }
+}
+ROOT_INFO_BODY = orjson.dumps(ROOT_INFO)
+
 @app.get("/")
 async def root():
     """首頁 - API 說明"""
-    return {
-        "message": "Welcome to EmoGo Backend API with GridFS",
-        "storage": "Videos stored permanently in MongoDB GridFS",
-        "endpoints": {
-            "POST /sentiments": "上傳情緒資料",
-            "POST /gps": "上傳 GPS 座標",
-            "POST /vlogs": "上傳影片（GridFS 永久儲存）",
-            "GET /export": "資料匯出頁面",
-            "GET /export/sentiments/csv": "下載情緒資料 (CSV)",
-            "GET /export/gps/csv": "下載 GPS 資料 (CSV)",
-            "GET /export/vlogs": "取得影片列表",
-            "GET /export/all": "在網頁查看所有資料 (JSON)",
-            "GET /export/all/download": "下載所有資料 (JSON 檔案)"
-        }
-    }
+    return Response(content=ROOT_INFO_BODY, media_type="application/json")
 
 @app.post("/sentiments")
 async def create_sentiment(sentiment: Sentiment):
     """接收情緒資料"""
-    sentiment_dict = sentiment.dict()
+    sentiment_dict = sentiment.model_dump()
     if sentiment_dict["timestamp"] is None:
-        sentiment_dict["timestamp"] = datetime.now()
+        sentiment_dict["timestamp"] = datetime.now(timezone.utc)
     
     result = await app.mongodb["sentiments"].insert_one(sentiment_dict)
     return {"message": "Sentiment saved", "id": str(result.inserted_id)}
@@ -108,13 +235,55 @@ async def create_sentiment(sentiment: Sentiment):
 @app.post("/gps")
 async def create_gps(gps: GPSCoordinate):
     """接收 GPS 座標"""
-    gps_dict = gps.dict()
+    gps_dict = gps.model_dump()
     if gps_dict["timestamp"] is None:
-        gps_dict["timestamp"] = datetime.now()
+        gps_dict["timestamp"] = datetime.now(timezone.utc)
     
     result = await app.mongodb["gps_coordinates"].insert_one(gps_dict)
     return {"message": "GPS coordinate saved", "id": str(result.inserted_id)}
 
+@app.post("/sentiments/bulk")
+async def create_sentiments_bulk(sentiments: List[Sentiment]):
+    """批次接收多筆情緒資料（單次 insert_many 寫入）"""
+    if not sentiments:
+        return {"message": "No sentiments to save", "count": 0, "ids": []}
+    
+    now = datetime.now(timezone.utc)
+    docs = []
+    for sentiment in sentiments:
+        sentiment_dict = sentiment.model_dump()
+        if sentiment_dict["timestamp"] is None:
+            sentiment_dict["timestamp"] = now
+        docs.append(sentiment_dict)
+    
+    result = await app.mongodb["sentiments"].insert_many(docs, ordered=False)
+    return {
+        "message": "Sentiments saved",
+        "count": len(result.inserted_ids),
+        "ids": [str(i) for i in result.inserted_ids]
+    }
+
+@app.post("/gps/bulk")
+async def create_gps_bulk(coordinates: List[GPSCoordinate]):
+    """批次接收多筆 GPS 座標（單次 insert_many 寫入）"""
+    if not coordinates:
+        return {"message": "No GPS coordinates to save", "count": 0, "ids": []}
+    
+    now = datetime.now(timezone.utc)
+    docs = []
+    for gps in coordinates:
+        gps_dict = gps.model_dump()
+        if gps_dict["timestamp"] is None:
+            gps_dict["timestamp"] = now
+        docs.append(gps_dict)
+    
+    result = await app.mongodb["gps_coordinates"].insert_many(docs, ordered=False)
+    return {
+        "message": "GPS coordinates saved",
+        "count": len(result.inserted_ids),
+        "ids": [str(i) for i in result.inserted_ids]
+    }
+
 @app.post("/vlogs")
 async def upload_vlog(
     file: UploadFile = File(...),
@@ -128,26 +297,29 @@ async def upload_vlog(
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{timestamp}_{file.filename}"
         
-        # 讀取檔案內容
-        content = await file.read()
-        file_size = len(content)
-        
-        # 🆕 上傳到 GridFS
-        grid_in = app.fs.open_upload_stream(
-            filename,
-            metadata={
-                "original_filename": file.filename,
-                "content_type": file.content_type or "video/mp4",
-                "description": description,
-                "upload_time": datetime.now(),
-                "size": file_size
-            }
-        )
+        metadata = {
+            "original_filename": file.filename,
+            "content_type": file.content_type or "video/mp4",
+            "description": description,
+            "upload_time": datetime.now(timezone.utc)
+        }
         
-        await grid_in.write(content)
-        await grid_in.close()
+        # 🆕 分段讀取上傳內容並寫入 GridFS，不把整個檔案載入記憶體
+        grid_in = app.fs.open_upload_stream(filename, metadata=metadata)
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await grid_in.write(chunk)
+            await grid_in.close()
+        except Exception:
+            await grid_in.abort()
+            raise
         
         file_id = grid_in._id
+        # GridFS 關閉檔案時已在 fs.files 記錄 length，直接沿用
+        file_size = grid_in.length
         
         # 將影片資訊存入 vlogs collection（保持原有結構，方便查詢）
         vlog_info = {
@@ -155,8 +327,9 @@ async def upload_vlog(
             "filename": filename,
             "original_filename": file.filename,
             "description": description,
-            "upload_time": datetime.now(),
+            "upload_time": datetime.now(timezone.utc),
             "size": file_size,
+            "size_mb_str": f"{file_size / (1024 * 1024):.2f} MB",  # 預先格式化，列表頁直接顯示
             "storage": "gridfs"  # 🆕 標記儲存方式
         }
         
@@ -173,10 +346,60 @@ async def upload_vlog(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+async def _iter_grid_out(grid_out, length=None):
+    """逐一輸出 GridFS 檔案的 chunk；指定 length 時只輸出從目前位置起的 length 個位元組"""
+    remaining = length
+    while remaining is None or remaining > 0:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            break
+        if remaining is not None:
+            if len(chunk) > remaining:
+                chunk = chunk[:remaining]
+            remaining -= len(chunk)
+        yield chunk
+
+def _parse_byte_range(range_header, size):
+    """解析單一區段的 Range 標頭並回傳 (start, end)
+    
+    不支援的格式（非 bytes、多個區段、語法錯誤，包含 last < first）回傳 None，改回傳完整檔案；
+    超出檔案範圍或長度為 0 的 suffix（bytes=-0）時丟出 ValueError。
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else None
+        else:
+            suffix = int(end_str)
+    except ValueError:
+        return None
+    if start_str:
+        if start < 0 or (end is not None and end < start):
+            return None
+        end = size - 1 if end is None else min(end, size - 1)
+    else:
+        if suffix < 0:
+            return None
+        if suffix == 0:
+            raise ValueError(f"Range not satisfiable: {range_header}")
+        start = max(size - suffix, 0)
+        end = size - 1
+    if start >= size:
+        raise ValueError(f"Range not satisfiable: {range_header}")
+    return start, end
+
 @app.get("/vlogs/{filename}")
-async def download_vlog(filename: str):
+async def download_vlog(filename: str, request: Request):
     """
     🆕 從 MongoDB GridFS 下載影片（永久可用）
+    
+    支援 Range 請求（影片播放器拖曳進度時只讀取需要的片段）與 ETag 快取驗證。
     """
     try:
         # 從資料庫取得影片資訊
@@ -192,38 +415,63 @@ async def download_vlog(filename: str):
             # 開啟 GridFS 檔案流
             grid_out = await app.fs.open_download_stream(file_id)
             
-            # 讀取檔案內容
-            contents = await grid_out.read()
-            
-            # 返回影片檔案
-            return Response(
-                content=contents,
-                media_type="video/mp4",
-                headers={
-                    "Content-Disposition": f"attachment; filename={vlog.get('original_filename', filename)}"
-                }
-            )
-            
         except Exception as e:
             raise HTTPException(
                 status_code=404, 
                 detail=f"Video file not found in GridFS: {str(e)}"
             )
+        
+        size = grid_out.length
+        # GridFS 檔案上傳後不會再變動，file_id 加上大小即可作為 ETag
+        etag = f'W/"{file_id}-{size}"'
+        headers = {
+            "Content-Disposition": f"attachment; filename={vlog.get('original_filename', filename)}",
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Cache-Control": "private, max-age=86400"
+        }
+        
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or etag in [tag.strip() for tag in if_none_match.split(",")]
+        ):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": headers["Cache-Control"]})
+        
+        range_header = request.headers.get("range")
+        if range_header:
+            try:
+                byte_range = _parse_byte_range(range_header, size)
+            except ValueError:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+            
+            if byte_range:
+                start, end = byte_range
+                grid_out.seek(start)
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                return StreamingResponse(
+                    _iter_grid_out(grid_out, end - start + 1),
+                    status_code=206,
+                    media_type="video/mp4",
+                    headers=headers
+                )
+        
+        # 逐塊串流影片內容，不把整個檔案讀進記憶體
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            _iter_grid_out(grid_out),
+            media_type="video/mp4",
+            headers=headers
+        )
             
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading video: {str(e)}")
 
-@app.get("/export", response_class=HTMLResponse)
-async def export_page():
-    """資料匯出頁面"""
-    
-    sentiment_count = await app.mongodb["sentiments"].count_documents({})
-    gps_count = await app.mongodb["gps_coordinates"].count_documents({})
-    vlog_count = await app.mongodb["vlogs"].count_documents({})
-    
-    html_content = f'''
+# /export 頁面模板（模組載入時建立一次，每次請求只填入三個計數）
+EXPORT_HTML_TEMPLATE = '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -379,32 +627,69 @@ async def export_page():
     </body>
     </html>
     '''
+
+# 模板預先切成固定的 bytes 片段，每次請求只需插入三個計數
+EXPORT_HTML_PARTS = [
+    part.encode('utf-8')
+    for part in EXPORT_HTML_TEMPLATE.format(
+        sentiment_count="\0", gps_count="\0", vlog_count="\0"
+    ).split("\0")
+]
+
+@app.get("/export", response_class=HTMLResponse)
+async def export_page():
+    """資料匯出頁面"""
+    
+    # 三個計數同時查詢；使用 collection metadata 估計筆數，不需掃描整個 collection
+    sentiment_count, gps_count, vlog_count = await asyncio.gather(
+        app.mongodb["sentiments"].estimated_document_count(),
+        app.mongodb["gps_coordinates"].estimated_document_count(),
+        app.mongodb["vlogs"].estimated_document_count()
+    )
+    
+    prefix, mid1, mid2, suffix = EXPORT_HTML_PARTS
+    html_content = b"".join([
+        prefix, str(sentiment_count).encode(),
+        mid1, str(gps_count).encode(),
+        mid2, str(vlog_count).encode(),
+        suffix
+    ])
     
     return HTMLResponse(content=html_content)
 
+def _csv_field(value):
+    """轉為 CSV 欄位字串（與 csv 模組預設的 QUOTE_MINIMAL 規則相同）"""
+    if value is None:
+        return ""
+    text = str(value)
+    if ',' in text or '"' in text or '\n' in text or '\r' in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
 @app.get("/export/sentiments/csv")
-async def export_sentiments_csv():
-    """下載情緒資料為 CSV 檔案"""
-    sentiments = await app.mongodb["sentiments"].find().to_list(1000)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['emotion', 'score', 'note', 'timestamp'])
-    
-    for s in sentiments:
-        timestamp = to_tw_time(s.get("timestamp"))
-        writer.writerow([
-            s.get('emotion', ''),
-            s.get('score', ''),
-            s.get('note', ''),
-            timestamp
-        ])
+async def export_sentiments_csv(limit: Optional[int] = None, after: Optional[str] = None):
+    """下載情緒資料為 CSV 檔案（逐筆串流輸出）"""
+    pipeline = _page_stages(limit, after) + [SENTIMENTS_TABLE_PROJECTION]
+    
+    async def row_iter():
+        yield '\ufeffemotion,score,note,timestamp\r\n'.encode('utf-8')
+        
+        lines = []
+        async for s in app.mongodb["sentiments"].aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE):
+            lines.append(
+                f"{_csv_field(s.get('emotion', ''))},{_csv_field(s.get('score', ''))},"
+                f"{_csv_field(s.get('note', ''))},{_csv_field(s.get('timestamp') or 'N/A')}\r\n"
+            )
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield "".join(lines).encode('utf-8')
+                lines = []
+        if lines:
+            yield "".join(lines).encode('utf-8')
     
     filename = f"sentiments_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    csv_content = '\ufeff' + output.getvalue()
     
-    return Response(
-        content=csv_content.encode('utf-8'),
+    return StreamingResponse(
+        row_iter(),
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -412,19 +697,18 @@ async def export_sentiments_csv():
 @app.get("/export/sentiments/preview", response_class=HTMLResponse)
 async def preview_sentiments():
     """預覽情緒資料"""
-    sentiments = await app.mongodb["sentiments"].find().to_list(100)
-    
-    rows = ""
-    for s in sentiments:
-        timestamp = to_tw_time(s.get("timestamp"))
-        rows += f"""
+    parts = []
+    async for s in app.mongodb["sentiments"].aggregate(SENTIMENTS_PREVIEW_PIPELINE):
+        timestamp = s.get("timestamp") or "N/A"
+        parts.append(f"""
         <tr>
-            <td>{s.get('emotion', 'N/A')}</td>
-            <td>{s.get('score', 'N/A')}</td>
-            <td>{s.get('note', 'N/A')}</td>
+            <td>{escape(str(s.get('emotion', 'N/A')))}</td>
+            <td>{escape(str(s.get('score', 'N/A')))}</td>
+            <td>{escape(str(s.get('note', 'N/A')))}</td>
             <td>{timestamp}</td>
         </tr>
-        """
+        """)
+    rows = "".join(parts)
     
     html = f"""
     <!DOCTYPE html>
@@ -456,27 +740,29 @@ async def preview_sentiments():
     return HTMLResponse(content=html)
 
 @app.get("/export/gps/csv")
-async def export_gps_csv():
-    """下載 GPS 資料為 CSV 檔案"""
-    gps_data = await app.mongodb["gps_coordinates"].find().to_list(1000)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['latitude', 'longitude', 'timestamp'])
-    
-    for g in gps_data:
-        timestamp = to_tw_time(g.get("timestamp"))
-        writer.writerow([
-            g.get('latitude', ''),
-            g.get('longitude', ''),
-            timestamp
-        ])
+async def export_gps_csv(limit: Optional[int] = None, after: Optional[str] = None):
+    """下載 GPS 資料為 CSV 檔案（逐筆串流輸出）"""
+    pipeline = _page_stages(limit, after) + [GPS_TABLE_PROJECTION]
+    
+    async def row_iter():
+        yield '\ufefflatitude,longitude,timestamp\r\n'.encode('utf-8')
+        
+        lines = []
+        async for g in app.mongodb["gps_coordinates"].aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE):
+            lines.append(
+                f"{_csv_field(g.get('latitude', ''))},{_csv_field(g.get('longitude', ''))},"
+                f"{_csv_field(g.get('timestamp') or 'N/A')}\r\n"
+            )
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield "".join(lines).encode('utf-8')
+                lines = []
+        if lines:
+            yield "".join(lines).encode('utf-8')
     
     filename = f"gps_coordinates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    csv_content = '\ufeff' + output.getvalue()
     
-    return Response(
-        content=csv_content.encode('utf-8'),
+    return StreamingResponse(
+        row_iter(),
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -484,18 +770,17 @@ async def export_gps_csv():
 @app.get("/export/gps/preview", response_class=HTMLResponse)
 async def preview_gps():
     """預覽 GPS 資料"""
-    gps_data = await app.mongodb["gps_coordinates"].find().to_list(100)
-    
-    rows = ""
-    for g in gps_data:
-        timestamp = to_tw_time(g.get("timestamp"))
-        rows += f"""
+    parts = []
+    async for g in app.mongodb["gps_coordinates"].aggregate(GPS_PREVIEW_PIPELINE):
+        timestamp = g.get("timestamp") or "N/A"
+        parts.append(f"""
         <tr>
-            <td>{g.get('latitude', 'N/A')}</td>
-            <td>{g.get('longitude', 'N/A')}</td>
+            <td>{escape(str(g.get('latitude', 'N/A')))}</td>
+            <td>{escape(str(g.get('longitude', 'N/A')))}</td>
             <td>{timestamp}</td>
         </tr>
-        """
+        """)
+    rows = "".join(parts)
     
     html = f"""
     <!DOCTYPE html>
@@ -526,28 +811,33 @@ async def preview_gps():
     return HTMLResponse(content=html)
 
 @app.get("/export/vlogs", response_class=HTMLResponse)
-async def export_vlogs():
+async def export_vlogs(limit: Optional[int] = None, after: Optional[str] = None):
     """列出所有影片（從 GridFS 永久儲存）"""
-    vlogs = await app.mongodb["vlogs"].find().to_list(1000)
+    cursor = app.mongodb["vlogs"].aggregate(
+        _page_stages(limit, after) + [VLOGS_LIST_PROJECTION],
+        batchSize=EXPORT_BATCH_SIZE
+    )
     
-    rows = ""
-    for v in vlogs:
+    parts = []
+    async for v in cursor:
         upload_time = to_tw_time(v.get("upload_time"))
-        size_mb = v.get("size", 0) / (1024 * 1024)
+        # 舊資料沒有 size_mb_str 時才即時計算
+        size_mb_str = v.get("size_mb_str") or f"{v.get('size', 0) / (1024 * 1024):.2f} MB"
         filename = v.get('filename', '')
         storage = v.get('storage', 'gridfs')
         
-        rows += f"""
+        parts.append(f"""
         <tr>
-            <td><input type="checkbox" class="video-checkbox" value="{filename}"></td>
-            <td>{v.get('original_filename', 'N/A')}</td>
-            <td>{v.get('description', 'N/A')}</td>
-            <td>{size_mb:.2f} MB</td>
+            <td><input type="checkbox" class="video-checkbox" value="{escape(filename)}"></td>
+            <td>{escape(str(v.get('original_filename', 'N/A')))}</td>
+            <td>{escape(str(v.get('description', 'N/A')))}</td>
+            <td>{size_mb_str}</td>
             <td>{upload_time}</td>
             <td><span style="color: green;">✅ GridFS</span></td>
-            <td><a href="/vlogs/{filename}">下載</a></td>
+            <td><a href="/vlogs/{escape(quote(filename))}">下載</a></td>
         </tr>
-        """
+        """)
+    rows = "".join(parts)
     
     html = f"""
     <!DOCTYPE html>
@@ -647,7 +937,8 @@ async def export_vlogs():
                     return;
                 }}
                 
-                const filenames = selected.join(',');
+                // 與單檔下載連結一致，先做 URL 編碼，避免檔名中的 & # + % 破壞 query string
+                const filenames = encodeURIComponent(selected.join(','));
                 window.location.href = `/export/vlogs/download-multiple?filenames=${{filenames}}`;
             }}
         </script>
@@ -656,203 +947,243 @@ async def export_vlogs():
     """
     return HTMLResponse(content=html)
 
-@app.get("/export/vlogs/download-all")
-async def download_all_vlogs():
-    """🆕 一鍵下載所有影片為 ZIP 檔案（從 GridFS）"""
-    vlogs = await app.mongodb["vlogs"].find().to_list(1000)
+# 已壓縮過的媒體格式，放入 ZIP 時不再 DEFLATE
+STORED_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.mkv', '.webm', '.avi', '.jpg', '.jpeg', '.png', '.gif')
+
+def _zip_compress_type(filename):
+    """依副檔名決定 ZIP 壓縮方式"""
+    if filename.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+class _ZipStreamWriter:
+    """供 zipfile 寫入的緩衝區，讓 ZIP 內容可以邊產生邊送出
+    
+    只保存 zipfile 傳入的 bytes 參考而不複製，ZIP_STORED 項目的影片
+    chunk 會原封不動地送到 response。
+    """
     
-    zip_buffer = io.BytesIO()
+    def __init__(self):
+        self._chunks = []
     
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for v in vlogs:
+    def write(self, data):
+        self._chunks.append(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        """取出目前累積的 ZIP 片段並清空緩衝區"""
+        chunks = self._chunks
+        self._chunks = []
+        return chunks
+
+async def _stream_vlogs_zip(vlogs):
+    """從 GridFS 逐塊讀取影片並串流組成 ZIP"""
+    writer = _ZipStreamWriter()
+    
+    with zipfile.ZipFile(writer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        async for v in vlogs:
+            # 先讀出第一個 chunk 再建立 ZIP 項目：fs.chunks 遺失或損毀的檔案在這裡就會失敗，
+            # 可以像原本一樣略過，不會讓整個下載中斷
             try:
-                file_id = ObjectId(v["file_id"])
-                grid_out = await app.fs.open_download_stream(file_id)
-                contents = await grid_out.read()
-                
-                original_filename = v.get('original_filename', v.get('filename'))
-                zip_file.writestr(original_filename, contents)
+                grid_out = await app.fs.open_download_stream(ObjectId(v["file_id"]))
+                first_chunk = await grid_out.readchunk()
             except Exception as e:
-                print(f"Error adding {v.get('filename')} to ZIP: {e}")
+                logger.warning(f"Error adding {v.get('filename')} to ZIP: {e}")
                 continue
+            
+            original_filename = v.get('original_filename', v.get('filename'))
+            zinfo = zipfile.ZipInfo(original_filename, date_time=datetime.now().timetuple()[:6])
+            zinfo.compress_type = _zip_compress_type(original_filename)
+            zinfo.file_size = grid_out.length
+            
+            async def entry_chunks():
+                if first_chunk:
+                    yield first_chunk
+                    async for chunk in _iter_grid_out(grid_out):
+                        yield chunk
+            
+            with zip_file.open(zinfo, 'w') as entry:
+                async for chunk in entry_chunks():
+                    if zinfo.compress_type == zipfile.ZIP_STORED:
+                        entry.write(chunk)
+                    else:
+                        # DEFLATE 是 CPU 密集的同步運算，移到 thread 執行以免卡住 event loop
+                        await asyncio.to_thread(entry.write, chunk)
+                    for data in writer.drain():
+                        yield data
+    
+    for data in writer.drain():
+        yield data
+
+@app.get("/export/vlogs/download-all")
+async def download_all_vlogs():
+    """🆕 一鍵下載所有影片為 ZIP 檔案（從 GridFS 串流輸出）"""
+    vlogs = app.mongodb["vlogs"].find(
+        {}, {"filename": 1, "original_filename": 1, "file_id": 1}
+    ).batch_size(EXPORT_BATCH_SIZE)
     
     zip_filename = f"emogo_vlogs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
     
-    zip_buffer.seek(0)
     return StreamingResponse(
-        iter([zip_buffer.getvalue()]),
+        _stream_vlogs_zip(vlogs),
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
     )
 
 @app.get("/export/vlogs/download-multiple")
 async def download_multiple_vlogs(filenames: str):
-    """🆕 下載選中的多個影片為 ZIP 檔案（從 GridFS）"""
+    """🆕 下載選中的多個影片為 ZIP 檔案（從 GridFS 串流輸出）"""
     filename_list = filenames.split(',')
     
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+    async def selected_vlogs():
+        # 一次查詢取回所有選取的影片，再依原本的順序輸出
+        docs = await app.mongodb["vlogs"].find(
+            {"filename": {"$in": filename_list}},
+            {"filename": 1, "original_filename": 1, "file_id": 1}
+        ).to_list(None)
+        vlogs_by_filename = {d["filename"]: d for d in docs}
         for filename in filename_list:
-            try:
-                vlog = await app.mongodb["vlogs"].find_one({"filename": filename})
-                if not vlog:
-                    continue
-                    
-                file_id = ObjectId(vlog["file_id"])
-                grid_out = await app.fs.open_download_stream(file_id)
-                contents = await grid_out.read()
-                
-                original_filename = vlog.get('original_filename', filename)
-                zip_file.writestr(original_filename, contents)
-            except Exception as e:
-                print(f"Error adding {filename} to ZIP: {e}")
-                continue
+            vlog = vlogs_by_filename.get(filename)
+            if vlog:
+                yield vlog
     
     zip_filename = f"emogo_vlogs_selected_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
     
-    zip_buffer.seek(0)
     return StreamingResponse(
-        iter([zip_buffer.getvalue()]),
+        _stream_vlogs_zip(selected_vlogs()),
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
     )
 
-@app.get("/export/all")
-async def export_all():
-    """在網頁上查看所有資料（JSON 格式）"""
-    sentiments = await app.mongodb["sentiments"].find().to_list(1000)
-    gps_data = await app.mongodb["gps_coordinates"].find().to_list(1000)
-    vlogs = await app.mongodb["vlogs"].find().to_list(1000)
-    
-    for s in sentiments:
-        s["_id"] = str(s["_id"])
-        if "timestamp" in s and s["timestamp"]:
-            dt = s["timestamp"]
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            tw_dt = dt.astimezone(TW_TZ)
-            s["timestamp"] = tw_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    for g in gps_data:
-        g["_id"] = str(g["_id"])
-        if "timestamp" in g and g["timestamp"]:
-            dt = g["timestamp"]
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            tw_dt = dt.astimezone(TW_TZ)
-            g["timestamp"] = tw_dt.strftime("%Y-%m-%d %H:%M:%S")
-        g.pop("accuracy", None)
-    
-    for v in vlogs:
-        v["_id"] = str(v["_id"])
-        v["file_id"] = str(v.get("file_id", ""))
-        if "upload_time" in v and v["upload_time"]:
-            dt = v["upload_time"]
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            tw_dt = dt.astimezone(TW_TZ)
-            v["upload_time"] = tw_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    return JSONResponse(content={
-        "sentiments": sentiments,
-        "gps_coordinates": gps_data,
-        "vlogs": vlogs,
-        "export_time": datetime.now(TW_TZ).strftime("%Y-%m-%d %H:%M:%S"),
+async def _prefetch_export_cursors():
+    """同時開啟三個匯出 cursor 並取回各自的第一批資料
+    
+    回傳 [(第一批文件, cursor), ...]，順序為 sentiments、gps_coordinates、vlogs。
+    """
+    cursors = [
+        app.mongodb["sentiments"].aggregate(SENTIMENTS_EXPORT_PIPELINE, batchSize=EXPORT_BATCH_SIZE),
+        app.mongodb["gps_coordinates"].aggregate(GPS_EXPORT_PIPELINE, batchSize=EXPORT_BATCH_SIZE),
+        app.mongodb["vlogs"].aggregate(VLOGS_EXPORT_PIPELINE, batchSize=EXPORT_BATCH_SIZE)
+    ]
+    heads = await asyncio.gather(*(c.to_list(EXPORT_BATCH_SIZE) for c in cursors))
+    return list(zip(heads, cursors))
+
+async def _stream_json_array(head, cursor, counts, key):
+    """輸出 JSON 陣列元素（先輸出已取回的 head，再讀 cursor），並將筆數記錄到 counts[key]
+    
+    每批文件以 orjson 編碼後用 b",".join 合併成一個 chunk 送出。
+    """
+    count = 0
+    if head:
+        yield b",".join([orjson.dumps(doc, default=str) for doc in head])
+        count = len(head)
+    
+    batch = []
+    async for doc in cursor:
+        batch.append(orjson.dumps(doc, default=str))
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield (b"," if count else b"") + b",".join(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        yield (b"," if count else b"") + b",".join(batch)
+        count += len(batch)
+    counts[key] = count
+
+def _export_trailer(counts):
+    """JSON 匯出結尾欄位（不含開頭的 '{'）"""
+    trailer = {
+        "export_time": datetime.now(TW_TZ).strftime(TW_TIME_FORMAT),
         "timezone": "Asia/Taipei (UTC+8)",
         "storage": "Videos stored in MongoDB GridFS (permanent)",
         "note": "所有時間已轉換為台灣時區 (UTC+8)",
         "total_records": {
-            "sentiments": len(sentiments),
-            "gps": len(gps_data),
-            "vlogs": len(vlogs)
+            "sentiments": counts["sentiments"],
+            "gps": counts["gps"],
+            "vlogs": counts["vlogs"]
         }
-    })
+    }
+    return orjson.dumps(trailer)[1:]
+
+async def _stream_all_data(sentiments, gps, vlogs):
+    """串流輸出完整匯出 JSON（/export/all 與 /export/all/download 共用）
+    
+    參數為 _prefetch_export_cursors() 回傳的 (第一批文件, cursor)。
+    """
+    counts = {}
+    yield b'{"sentiments":['
+    async for item in _stream_json_array(*sentiments, counts, "sentiments"):
+        yield item
+    yield b'],"gps_coordinates":['
+    async for item in _stream_json_array(*gps, counts, "gps"):
+        yield item
+    yield b'],"vlogs":['
+    async for item in _stream_json_array(*vlogs, counts, "vlogs"):
+        yield item
+    yield b'],' + _export_trailer(counts)
+
+@app.get("/export/all")
+async def export_all():
+    """在網頁上查看所有資料（JSON 格式，逐筆串流輸出）"""
+    sentiments, gps, vlogs = await _prefetch_export_cursors()
+    
+    return StreamingResponse(_stream_all_data(sentiments, gps, vlogs), media_type="application/json")
+
+async def _clear_gridfs():
+    """一次刪除所有 GridFS 檔案與 chunks，回傳刪除的檔案數"""
+    try:
+        files_result, _ = await asyncio.gather(
+            app.mongodb["fs.files"].delete_many({}),
+            app.mongodb["fs.chunks"].delete_many({})
+        )
+        return files_result.deleted_count
+    except Exception as e:
+        logger.exception(f"Error clearing GridFS: {e}")
+        return 0
 
 @app.post("/clear_all_data")
 async def clear_all_data():
     """🆕 刪除所有資料（包括 GridFS 檔案）"""
-    deleted_counts = {}
+    collections = ["sentiments", "gps_coordinates", "vlogs"]
     
-    # 刪除 collections
-    for collection in ["sentiments", "gps_coordinates", "vlogs"]:
-        result = await app.mongodb[collection].delete_many({})
-        deleted_counts[collection] = result.deleted_count
+    # 所有 collection 與 GridFS 同時清空
+    *results, gridfs_count = await asyncio.gather(
+        *(app.mongodb[collection].delete_many({}) for collection in collections),
+        _clear_gridfs()
+    )
     
-    # 🆕 刪除所有 GridFS 檔案
-    try:
-        cursor = app.fs.find()
-        gridfs_count = 0
-        async for grid_file in cursor:
-            await app.fs.delete(grid_file._id)
-            gridfs_count += 1
-        deleted_counts["gridfs_files"] = gridfs_count
-    except Exception as e:
-        print(f"Error clearing GridFS: {e}")
-        deleted_counts["gridfs_files"] = 0
+    deleted_counts = {
+        collection: result.deleted_count
+        for collection, result in zip(collections, results)
+    }
+    deleted_counts["gridfs_files"] = gridfs_count
     
     return {"success": True, "deleted_counts": deleted_counts}
 
 @app.get("/export/all/download")
 async def download_all():
-    """下載所有資料為 JSON 檔案"""
-    sentiments = await app.mongodb["sentiments"].find().to_list(1000)
-    gps_data = await app.mongodb["gps_coordinates"].find().to_list(1000)
-    vlogs = await app.mongodb["vlogs"].find().to_list(1000)
-    
-    for s in sentiments:
-        s["_id"] = str(s["_id"])
-        if "timestamp" in s and s["timestamp"]:
-            dt = s["timestamp"]
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            tw_dt = dt.astimezone(TW_TZ)
-            s["timestamp"] = tw_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    for g in gps_data:
-        g["_id"] = str(g["_id"])
-        if "timestamp" in g and g["timestamp"]:
-            dt = g["timestamp"]
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            tw_dt = dt.astimezone(TW_TZ)
-            g["timestamp"] = tw_dt.strftime("%Y-%m-%d %H:%M:%S")
-        g.pop("accuracy", None)
-    
-    for v in vlogs:
-        v["_id"] = str(v["_id"])
-        v["file_id"] = str(v.get("file_id", ""))
-        if "upload_time" in v and v["upload_time"]:
-            dt = v["upload_time"]
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            tw_dt = dt.astimezone(TW_TZ)
-            v["upload_time"] = tw_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    data = {
-        "sentiments": sentiments,
-        "gps_coordinates": gps_data,
-        "vlogs": vlogs,
-        "export_time": datetime.now(TW_TZ).strftime("%Y-%m-%d %H:%M:%S"),
-        "timezone": "Asia/Taipei (UTC+8)",
-        "storage": "Videos stored in MongoDB GridFS (permanent)",
-        "note": "所有時間已轉換為台灣時區 (UTC+8)",
-        "total_records": {
-            "sentiments": len(sentiments),
-            "gps": len(gps_data),
-            "vlogs": len(vlogs)
-        }
-    }
+    """下載所有資料為 JSON 檔案（逐筆串流輸出）"""
+    sentiments, gps, vlogs = await _prefetch_export_cursors()
     
     filename = f"emogo_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    json_str = json.dumps(data, ensure_ascii=False, indent=2)
     
-    return Response(
-        content=json_str,
+    return StreamingResponse(
+        _stream_all_data(sentiments, gps, vlogs),
         media_type="application/json",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop / httptools 由 uvicorn[standard] 提供；多個 worker 時每個 process 各自建立 MongoDB 連線池
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
\ No newline at end of file